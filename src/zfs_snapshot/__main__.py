@@ -7,15 +7,14 @@ from __future__ import annotations
 
 import argparse
 import datetime
-from dataclasses import dataclass
-from typing import Any
+import subprocess
+from typing import Any, NamedTuple
 
 from . import zfs_snapshot
 
 
-@dataclass(frozen=True, init=True, repr=True)
-class SnapshotPolicy:
-    """Dataclass which defines a snapshot policy.
+class SnapshotPolicy(NamedTuple):
+    """Named tuple which defines a snapshot policy.
 
     Fields:
         name: snapshot policy descriptor, e.g., "years".
@@ -30,7 +29,6 @@ class SnapshotPolicy:
 
 
 DATE_ELEMENT_SEPARATOR = "."
-NOW = datetime.datetime.now()  # noqa: DTZ005
 # These are very much approximations of reality.
 #
 # I really wish `dateutil.relativedelta(..)` actually worked reliably; it
@@ -59,6 +57,21 @@ SNAPSHOT_CATEGORIES = [
         name="hours", lifetime=datetime.timedelta(days=1), date_format_qualifier="H",
     ),
 ]
+# This builds a hierarchical date string in reverse recursive order, per
+# snapshot period, e.g., "2018.09.01" would be "daily".
+#
+# This depends on the ordering of `SNAPSHOT_CATEGORIES`.
+DATE_FORMATS = [
+    DATE_ELEMENT_SEPARATOR.join(
+        "%" + SNAPSHOT_CATEGORIES[i].date_format_qualifier for i in range(k + 1)
+    )
+    for k in range(len(SNAPSHOT_CATEGORIES))
+]
+# Map of snapshot period names to their index in `SNAPSHOT_CATEGORIES`.
+SNAPSHOT_PERIODS = {policy.name: i for i, policy in enumerate(SNAPSHOT_CATEGORIES)}
+# Upper bound on the number of vdevs to process concurrently when --jobs isn't
+# specified.
+DEFAULT_MAX_JOBS = 32
 DEFAULT_SNAPSHOT_PERIOD = "hours"
 DEFAULT_SNAPSHOT_PREFIX = "auto"
 
@@ -73,6 +86,15 @@ def list_vdevs(*args: Any, **kwargs: Any) -> list[str]:
     return zfs_snapshot.list_vdevs(*args, **kwargs)
 
 
+def jobs_type(optarg: str) -> int:
+    """Validate --jobs to ensure that it's > 0."""
+    value = int(optarg)
+    if value <= 0:
+        msg = "Number of jobs must be an integer value greater than 0"
+        raise argparse.ArgumentTypeError(msg)
+    return value
+
+
 def lifetime_type(optarg: str) -> int:
     """Validate --lifetime to ensure that it's > 0."""
     value = int(optarg)
@@ -87,9 +109,8 @@ def lifetime_type(optarg: str) -> int:
 def period_type(optarg: str) -> int:
     """Validate --snapshot-period to ensure that the value passed is valid."""
     value = optarg.lower()
-    for i, mapping_tuple in enumerate(SNAPSHOT_CATEGORIES):
-        if mapping_tuple.name == value:
-            return i
+    if value in SNAPSHOT_PERIODS:
+        return SNAPSHOT_PERIODS[value]
     raise argparse.ArgumentTypeError("Invalid --snapshot-period: %s" % (optarg))
 
 
@@ -112,9 +133,18 @@ def vdev_type(optarg: str) -> str:
         The parsed value corresponding to a valid `vdev`.
 
     """
-    all_vdevs = list_vdevs()
     value = optarg
-    if value in all_vdevs:
+    # Only look up the vdev in question, instead of listing every vdev on the
+    # system. "--" ensures the value isn't parsed as an option, and zfs(8)'s
+    # error message is discarded in favor of the one below.
+    try:
+        zfs_snapshot.zfs(
+            ["list", "-H", "-t", "filesystem,volume", "-o", "name", "--", value],
+            quiet=True,
+        )
+    except subprocess.CalledProcessError:
+        pass
+    else:
         return value
     err_msg = f"Virtual device specified, '{value}', does not exist"
     raise argparse.ArgumentTypeError(err_msg)
@@ -131,6 +161,14 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
 
     """
     parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--jobs",
+        help=(
+            "maximum number of vdevs to process concurrently; defaults to the "
+            f"number of vdevs, up to {DEFAULT_MAX_JOBS}"
+        ),
+        type=jobs_type,
+    )
     parser.add_argument(
         "--lifetime",
         help=(
@@ -171,12 +209,14 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
 def compute_cutoff(
     policy: SnapshotPolicy,
     lifetime_override: float,
+    now: datetime.datetime,
 ) -> datetime.datetime:
     """Compute the expiration time for a given policy.
 
     Args:
         policy: the snapshot policy.
         lifetime_override: an override value for the snapshot lifetime.
+        now: the time to compute the expiration time relative to.
 
     Returns:
         A `datetime.datetime` object that corresponds to a snapshot's lifetime.
@@ -193,7 +233,7 @@ def compute_cutoff(
         lifetime = datetime.timedelta(**{policy_name: lifetime_override})
     else:
         lifetime = policy.lifetime
-    return NOW - lifetime
+    return now - lifetime
 
 
 def compute_vdevs(vdevs: list[str], recursive: bool) -> list[str]:
@@ -207,30 +247,35 @@ def compute_vdevs(vdevs: list[str], recursive: bool) -> list[str]:
         A list of vdevs that is a superset of the provided vdevs.
 
     """
+    # Drop duplicate vdevs (preserving order), so the same vdev isn't
+    # snapshotted more than once.
+    vdevs = list(dict.fromkeys(vdevs))
     if recursive and vdevs:
-        target_vdevs = []
-        for vdev in vdevs:
-            target_vdevs.extend(
-                zfs_snapshot.zfs(f"list -H -o name -r {vdev}").splitlines(),
-            )
-        return target_vdevs
+        # Listing a vdev recursively includes its children, so skip vdevs
+        # nested under another vdev which is being listed.
+        top_level_vdevs = [
+            vdev
+            for vdev in vdevs
+            if not any(vdev.startswith(parent + "/") for parent in vdevs)
+        ]
+        # zfs(8) accepts multiple vdevs, so list them all with a single call.
+        output = zfs_snapshot.zfs(
+            ["list", "-H", "-o", "name", "-r", *top_level_vdevs],
+        )
+        # `zfs list -H` only delimits lines with "\n", so there's no need for
+        # `str.splitlines(..)`'s handling of other line boundaries.
+        target_vdevs = output.rstrip("\n").split("\n") if output else []
+        return list(dict.fromkeys(target_vdevs))
     return vdevs or list_vdevs()
 
 
 def main(args: list[str] | None = None) -> int:
     """Eponymous main."""
-    args = parse_args(args=args)
-
-    # This builds a hierarchical date string in reverse recursive order, e.g.,
-    # "2018.09.01" would be "daily".
-    #
-    # This depends on the ordering of `SNAPSHOT_CATEGORIES`.
-    date_format = DATE_ELEMENT_SEPARATOR.join(
-        [
-            "%" + SNAPSHOT_CATEGORIES[i].date_format_qualifier
-            for i in range(args.snapshot_period + 1)
-        ],
-    )
+    args = parse_args(argv=args)
+    # Snapshot names are in local time, as the snapshots have always been named.
+    now = datetime.datetime.now()  # noqa: DTZ005
+
+    date_format = DATE_FORMATS[args.snapshot_period]
 
     snapshot_category = SNAPSHOT_CATEGORIES[args.snapshot_period]
     snapshot_suffix = snapshot_category.date_format_qualifier
@@ -240,16 +285,36 @@ def main(args: list[str] | None = None) -> int:
         date_format,
         snapshot_suffix,
     )
-    snapshot_cutoff = compute_cutoff(snapshot_category, args.lifetime)
+    snapshot_cutoff = compute_cutoff(snapshot_category, args.lifetime, now)
     vdevs = compute_vdevs(args.vdevs, args.recursive)
 
-    for vdev in sorted(vdevs, reverse=True):
+    now_tt = now.timetuple()
+    cutoff_tt = snapshot_cutoff.timetuple()
+    max_workers = args.jobs or max(1, min(DEFAULT_MAX_JOBS, len(vdevs)))
+
+    def execute_vdev_snapshot_policy(vdev: str) -> None:
         execute_snapshot_policy(
             vdev,
-            NOW.timetuple(),
-            snapshot_cutoff.timetuple(),
+            now_tt,
+            cutoff_tt,
             snapshot_name_format,
             recursive=args.recursive,
         )
 
+    vdevs = sorted(vdevs, reverse=True)
+    if max_workers == 1:
+        for vdev in vdevs:
+            execute_vdev_snapshot_policy(vdev)
+        return 0
+
+    # Deferred import: concurrent.futures is relatively expensive to import
+    # and isn't needed when vdevs are processed serially.
+    from concurrent.futures import ThreadPoolExecutor  # noqa: PLC0415
+
+    # Most of the time spent executing a snapshot policy is spent waiting on
+    # zfs(8), so threads are sufficient to overlap the work done per vdev.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Consume the results so any exceptions raised are propagated.
+        list(executor.map(execute_vdev_snapshot_policy, vdevs))
+
     return 0
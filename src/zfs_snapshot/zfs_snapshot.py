@@ -1,21 +1,266 @@
 """zfs_snapshot: core functionality."""
 # SPDX-License-Identifier: BSD-2-Clause
 
-import shlex
+from __future__ import annotations
+
+import contextlib
+import ctypes
+import functools
+import os
+import re
+import signal
 import subprocess
 import time
-
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Generator, Iterator
+    from typing import TextIO
+
+# Regular expressions for the strftime(3) directives supported in snapshot date
+# formats, keyed by directive. These mirror the expressions used by
+# `time.strptime(..)`.
+DATE_FORMAT_DIRECTIVES = {
+    "Y": r"\d\d\d\d",
+    "m": r"1[0-2]|0[1-9]|[1-9]",
+    "d": r"3[01]|[12]\d|0[1-9]|[1-9]| [1-9]",
+    "H": r"2[0-3]|[0-1]\d|\d",
+    "M": r"[0-5]\d|\d",
+    "S": r"6[0-1]|[0-5]\d|\d",
+}
+# Default values for date fields missing from a date format, in
+# `time.struct_time` order, i.e., 1900-01-01 00:00:00 (like `time.strptime(..)`).
+DATE_FIELD_DEFAULTS = {"Y": 1900, "m": 1, "d": 1, "H": 0, "M": 0, "S": 0}
+# Well-known (libzfs_core, libnvpair) shared library names, tried before
+# falling back to the comparatively slow `ctypes.util.find_library(..)`, e.g.,
+# OpenZFS 2.x and FreeBSD's base system ZFS.
+LIBZFS_CORE_SONAMES = [
+    ("libzfs_core.so.3", "libnvpair.so.3"),
+    ("libzfs_core.so.2", "libnvpair.so.2"),
+]
+# nvlist_alloc(3) flag: nvpair names must be unique.
+NV_UNIQUE_NAME = 0x1
+# Cap the number of snapshots passed to a single `zfs destroy` invocation;
+# destroying too many snapshots in one transaction can stall the pool.
+DESTROY_BATCH_SIZE = 100
+SNAPSHOT_NAME_SEPARATOR = ","
 SNAPSHOT_SEPARATOR = "@"
+STDERR_FILENO = 2
+STDOUT_FILENO = 1
 ZFS = "/sbin/zfs"
 
 
-# ruff: noqa: FBT001, FBT002, S603
+# ruff: noqa: FBT001, FBT002
 
 
 class VdevNotFoundError(FileNotFoundError):
     """Wrapper exception to aid with filtering out this particular scenario."""
 
 
+class LibZfsCore:
+    """Minimal ctypes wrapper around libzfs_core(3).
+
+    Using the library directly avoids forking and executing zfs(8) for each
+    snapshot created or destroyed, and allows several snapshots to be
+    destroyed with a single ioctl(2).
+    """
+
+    def __init__(self, libzfs_core_path: str, libnvpair_path: str) -> None:
+        """Load libzfs_core(3) and libnvpair(3).
+
+        Args:
+            libzfs_core_path: path to the libzfs_core shared library.
+            libnvpair_path:   path to the libnvpair shared library.
+
+        Raises:
+            OSError: the libraries could not be loaded or initialized.
+
+        """
+        nvpair = ctypes.CDLL(libnvpair_path)
+        nvpair.nvlist_alloc.argtypes = [
+            ctypes.POINTER(ctypes.c_void_p),
+            ctypes.c_uint,
+            ctypes.c_int,
+        ]
+        nvpair.nvlist_alloc.restype = ctypes.c_int
+        nvpair.nvlist_add_boolean.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+        nvpair.nvlist_add_boolean.restype = ctypes.c_int
+        nvpair.nvlist_free.argtypes = [ctypes.c_void_p]
+        nvpair.nvlist_free.restype = None
+        nvpair.nvlist_next_nvpair.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        nvpair.nvlist_next_nvpair.restype = ctypes.c_void_p
+        nvpair.nvpair_name.argtypes = [ctypes.c_void_p]
+        nvpair.nvpair_name.restype = ctypes.c_char_p
+        nvpair.nvpair_value_int32.argtypes = [
+            ctypes.c_void_p,
+            ctypes.POINTER(ctypes.c_int32),
+        ]
+        nvpair.nvpair_value_int32.restype = ctypes.c_int
+
+        lzc = ctypes.CDLL(libzfs_core_path)
+        lzc.libzfs_core_init.argtypes = []
+        lzc.libzfs_core_init.restype = ctypes.c_int
+        lzc.lzc_snapshot.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_void_p,
+            ctypes.POINTER(ctypes.c_void_p),
+        ]
+        lzc.lzc_snapshot.restype = ctypes.c_int
+        lzc.lzc_destroy_snaps.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_int,
+            ctypes.POINTER(ctypes.c_void_p),
+        ]
+        lzc.lzc_destroy_snaps.restype = ctypes.c_int
+
+        error = lzc.libzfs_core_init()
+        if error:
+            raise OSError(error, os.strerror(error))
+
+        self._lzc = lzc
+        self._nvpair = nvpair
+
+    @contextlib.contextmanager
+    def _nvlist(self, names: list[str]) -> Iterator[ctypes.c_void_p]:
+        """Build an nvlist(3) with a boolean entry for each name.
+
+        Args:
+            names: the names to add to the nvlist.
+
+        Yields:
+            The nvlist; it is freed when the context is exited.
+
+        """
+        nvl = ctypes.c_void_p()
+        error = self._nvpair.nvlist_alloc(ctypes.byref(nvl), NV_UNIQUE_NAME, 0)
+        if error:
+            raise OSError(error, os.strerror(error))
+        try:
+            for name in names:
+                error = self._nvpair.nvlist_add_boolean(nvl, os.fsencode(name))
+                if error:
+                    raise OSError(error, os.strerror(error), name)
+            yield nvl
+        finally:
+            self._nvpair.nvlist_free(nvl)
+
+    def _errors(self, errlist: ctypes.c_void_p) -> list[tuple[str, int]]:
+        """Read the per-snapshot errors from a libzfs_core(3) error list.
+
+        Args:
+            errlist: an nvlist(3) mapping snapshot names to int32 errnos.
+
+        Returns:
+            A list of (snapshot name, errno) tuples.
+
+        """
+        errors = []
+        value = ctypes.c_int32()
+        nvp = self._nvpair.nvlist_next_nvpair(errlist, None)
+        while nvp:
+            name = os.fsdecode(self._nvpair.nvpair_name(nvp))
+            if self._nvpair.nvpair_value_int32(nvp, ctypes.byref(value)) == 0:
+                errors.append((name, value.value))
+            nvp = self._nvpair.nvlist_next_nvpair(errlist, nvp)
+        return errors
+
+    def _call(
+        self,
+        func: Callable[..., int],
+        snapshots: list[str],
+        *args: int | None,
+    ) -> None:
+        """Call a libzfs_core(3) function which takes an nvlist of snapshots.
+
+        Args:
+            func:      the libzfs_core(3) function to call.
+            snapshots: snapshot names to pass as the first argument.
+            args:      additional arguments to pass before the error list.
+
+        Raises:
+            OSError: the libzfs_core(3) function call failed. If the failure
+                     can be attributed to specific snapshots, the exception
+                     names them along with the reason each one failed.
+
+        """
+        errlist = ctypes.c_void_p()
+        with self._nvlist(snapshots) as nvl:
+            error = func(nvl, *args, ctypes.byref(errlist))
+        errors = []
+        if errlist:
+            try:
+                errors = self._errors(errlist)
+            finally:
+                self._nvpair.nvlist_free(errlist)
+        if not error:
+            return
+        if not errors:
+            raise OSError(
+                error,
+                os.strerror(error),
+                SNAPSHOT_NAME_SEPARATOR.join(snapshots),
+            )
+        if len(errors) == 1:
+            name, error = errors[0]
+            raise OSError(error, os.strerror(error), name)
+        # Mirror zfs(8), which reports each snapshot that failed and why.
+        reasons = "; ".join(
+            f"{name}: {os.strerror(snap_error)}" for name, snap_error in errors
+        )
+        raise OSError(error, f"{os.strerror(error)} ({reasons})")
+
+    def snapshot(self, snapshots: list[str]) -> None:
+        """Create one or more snapshots atomically via lzc_snapshot(3).
+
+        Args:
+            snapshots: full names of the snapshots to create. All snapshots
+                       must be in the same pool.
+
+        """
+        self._call(self._lzc.lzc_snapshot, snapshots, None)
+
+    def destroy_snaps(self, snapshots: list[str], defer: bool = False) -> None:
+        """Destroy one or more snapshots via lzc_destroy_snaps(3).
+
+        Args:
+            snapshots: full names of the snapshots to destroy. All snapshots
+                       must be in the same pool.
+            defer:     mark snapshots for deferred destruction if they can't
+                       be destroyed immediately.
+
+        """
+        self._call(self._lzc.lzc_destroy_snaps, snapshots, int(defer))
+
+
+@functools.cache
+def libzfs_core() -> LibZfsCore | None:
+    """Return a handle for the libzfs_core library, if available.
+
+    Returns:
+        A `LibZfsCore` object, or `None` if the libraries could not be loaded,
+        in which case callers should fall back to zfs(8).
+
+    """
+    for libzfs_core_path, libnvpair_path in LIBZFS_CORE_SONAMES:
+        try:
+            return LibZfsCore(libzfs_core_path, libnvpair_path)
+        except (AttributeError, OSError):
+            continue
+
+    # ctypes.util.find_library(..) may run external programs (e.g.,
+    # ldconfig(8)) to search for libraries, so only use it as a last resort.
+    import ctypes.util  # noqa: PLC0415
+
+    found_libzfs_core = ctypes.util.find_library("zfs_core")
+    found_libnvpair = ctypes.util.find_library("nvpair")
+    if found_libzfs_core is None or found_libnvpair is None:
+        return None
+    try:
+        return LibZfsCore(found_libzfs_core, found_libnvpair)
+    except (AttributeError, OSError):
+        return None
+
+
 def snapshot_name(vdev: str, date_format: str) -> str:
     """Create a properly formatted snapshot name.
 
@@ -28,22 +273,114 @@ def snapshot_name(vdev: str, date_format: str) -> str:
     return f"{vdev}{SNAPSHOT_SEPARATOR}{date_format}"
 
 
-def zfs(arg_str: str) -> str:
+@contextlib.contextmanager
+def spawn_zfs(argv: list[str], quiet: bool = False) -> Iterator[TextIO]:
+    """Run a zfs subcommand with its output connected to a pipe.
+
+    zfs(8) is started with posix_spawn(3) rather than `subprocess`, which
+    forks the interpreter first on platforms other than Linux (and copies its
+    page tables in the process).
+
+    Args:
+        argv:  a list of arguments to pass to zfs(8), e.g.,
+               `["list", "-t", "snapshot"]`.
+        quiet: discard error messages from zfs(8).
+
+    Raises:
+        subprocess.CalledProcessError: zfs(8) exited with a non-zero status.
+
+    Yields:
+        A text stream with the output from zfs(8). If the context is exited
+        with an exception (including `GeneratorExit`), zfs(8) is killed.
+
+    """
+    # The pipe's file descriptors are close-on-exec, but POSIX_SPAWN_DUP2
+    # clears the flag on the duplicate.
+    read_fd, write_fd = os.pipe()
+    file_actions: list[tuple[int | str, ...]] = [
+        (os.POSIX_SPAWN_DUP2, write_fd, STDOUT_FILENO),
+    ]
+    if quiet:
+        file_actions.append(
+            (os.POSIX_SPAWN_OPEN, STDERR_FILENO, os.devnull, os.O_WRONLY, 0),
+        )
+    try:
+        pid = os.posix_spawn(
+            ZFS,
+            [ZFS, *argv],
+            os.environ,
+            file_actions=file_actions,
+            # Python ignores SIGPIPE, and ignored signals are inherited.
+            setsigdef=(signal.SIGPIPE,),
+        )
+    except BaseException:
+        os.close(read_fd)
+        raise
+    finally:
+        os.close(write_fd)
+
+    stdout = os.fdopen(read_fd, encoding="utf-8", errors="surrogateescape")
+    try:
+        yield stdout
+    except BaseException:
+        os.kill(pid, signal.SIGKILL)
+        raise
+    finally:
+        stdout.close()
+        _, status = os.waitpid(pid, 0)
+
+    returncode = os.waitstatus_to_exitcode(status)
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, [ZFS, *argv])
+
+
+def zfs(argv: list[str], quiet: bool = False) -> str:
     """Run a zfs subcommand.
 
     Args:
-        arg_str: a flat string with a list of arguments to pass to zfs(8),
-                 e.g. -t snapshot.
+        argv:  a list of arguments to pass to zfs(8), e.g.,
+               `["list", "-t", "snapshot"]`.
+        quiet: discard error messages from zfs(8).
+
+    Raises:
+        subprocess.CalledProcessError: zfs(8) exited with a non-zero status.
 
     Returns:
         The output from zfs(8).
 
     """
-    return subprocess.check_output(
-        [ZFS, *shlex.split(arg_str)],
-        encoding="utf-8",
-        errors="surrogateescape",
-    )
+    output = ""
+    try:
+        with spawn_zfs(argv, quiet=quiet) as stdout:
+            output = stdout.read()
+    except subprocess.CalledProcessError as e:
+        e.output = output
+        raise
+    return output
+
+
+def zfs_iter(argv: list[str]) -> Generator[str, None, None]:
+    """Run a zfs subcommand, streaming its output.
+
+    Unlike `zfs(..)`, output is yielded line by line as zfs(8) produces it,
+    instead of being buffered in its entirety first.
+
+    Args:
+        argv: a list of arguments to pass to zfs(8), e.g.,
+              `["list", "-t", "snapshot"]`.
+
+    Raises:
+        subprocess.CalledProcessError: zfs(8) exited with a non-zero status.
+
+    Yields:
+        Each line of output from zfs(8), without the trailing newline.
+
+    """
+    # If the caller stops consuming output early, `GeneratorExit` is raised
+    # here and zfs(8) is killed.
+    with spawn_zfs(argv) as stdout:
+        for line in stdout:
+            yield line.rstrip("\n")
 
 
 def create_snapshot(vdev: str, date_format: str) -> None:
@@ -56,17 +393,57 @@ def create_snapshot(vdev: str, date_format: str) -> None:
 
     """
     snap_name = snapshot_name(vdev, date_format)
-    zfs(f"snapshot {snap_name}")
+    lzc = libzfs_core()
+    if lzc is None:
+        zfs(["snapshot", snap_name])
+    else:
+        lzc.snapshot([snap_name])
 
 
 def destroy_snapshot(snapshot: str) -> None:
     """Destroy a snapshot.
 
     Args:
-        snapshot: name of the snapshot to destroy.
+        snapshot: name of the snapshot to destroy. Multiple snapshots of the
+                  same vdev may be specified using the `vdev@snap1,snap2`
+                  form supported by zfs(8).
 
     """
-    zfs(f"destroy {snapshot}")
+    lzc = libzfs_core()
+    if lzc is None:
+        zfs(["destroy", snapshot])
+    else:
+        vdev, _, names = snapshot.partition(SNAPSHOT_SEPARATOR)
+        lzc.destroy_snaps(
+            [
+                snapshot_name(vdev, name)
+                for name in names.split(SNAPSHOT_NAME_SEPARATOR)
+            ],
+        )
+
+
+def destroy_snapshots(snapshots: list[str]) -> None:
+    """Destroy one or more snapshots in batches.
+
+    Snapshots are grouped by vdev and destroyed using the
+    `zfs destroy vdev@snap1,snap2,...` form, so ZFS can free several
+    snapshots with a single command. No more than `DESTROY_BATCH_SIZE`
+    snapshots are destroyed per invocation.
+
+    Args:
+        snapshots: names of the snapshots to destroy. The relative order of
+                   snapshots from the same vdev is preserved.
+
+    """
+    snapshots_by_vdev: dict[str, list[str]] = {}
+    for snapshot in snapshots:
+        vdev, _, name = snapshot.partition(SNAPSHOT_SEPARATOR)
+        snapshots_by_vdev.setdefault(vdev, []).append(name)
+
+    for vdev, names in snapshots_by_vdev.items():
+        for i in range(0, len(names), DESTROY_BATCH_SIZE):
+            batch = SNAPSHOT_NAME_SEPARATOR.join(names[i : i + DESTROY_BATCH_SIZE])
+            destroy_snapshot(snapshot_name(vdev, batch))
 
 
 def list_vdevs() -> list[str]:
@@ -79,35 +456,131 @@ def list_vdevs() -> list[str]:
         A list of available vdevs.
 
     """
-    vdevs = zfs("list -H -t filesystem,volume -o name").split()
+    vdevs = list(
+        zfs_iter(["list", "-H", "-t", "filesystem,volume", "-o", "name"]),
+    )
     if not vdevs:
         msg = "no vdevs found on system"
         raise VdevNotFoundError(msg)
     return vdevs
 
 
-def list_snapshots(vdev: str, recursive: bool = True) -> list[str]:
-    """Get a list of ZFS snapshots for a given vdev.
+def list_snapshots(
+    vdev: str,
+    recursive: bool = True,
+    depth: int | None = None,
+) -> Generator[str, None, None]:
+    """Get ZFS snapshots for a given vdev.
 
     Args:
         vdev:      a vdev to grab snapshots for.
         recursive: list snapshot(s) for the parent and child vdevs.
+        depth:     limit recursion to this many levels, e.g., 1 only lists
+                   snapshots of `vdev` itself. This takes precedence over
+                   `recursive`.
+
+    Yields:
+        Zero or more snapshots, sorted by creation time (oldest first).
+
+    """
+    argv = ["list", "-H", "-t", "snapshot", "-o", "name", "-s", "creation"]
+    if depth is not None:
+        argv.extend(["-d", str(depth)])
+    elif recursive:
+        argv.append("-r")
+
+    yield from zfs_iter([*argv, vdev])
+
+
+@functools.cache
+def date_pattern(date_format: str) -> re.Pattern[str] | None:
+    """Translate a snapshot date format into a regular expression.
+
+    Matching snapshot names against the compiled expression is considerably
+    cheaper than calling `time.strptime(..)` for every snapshot. The
+    expression doesn't include the vdev name, so it's compiled once per date
+    format and shared by all vdevs. Like `time.strptime(..)`, it matches
+    case-insensitively, and whitespace matches any run of whitespace.
+
+    Args:
+        date_format: strftime(3) compatible date format used to name
+                     snapshots.
 
     Returns:
-        A list of zero or more snapshots
+        A compiled regular expression with a named group per date field, or
+        None if the date format uses directives other than those in
+        `DATE_FORMAT_DIRECTIVES` (and `%%`), or repeats a directive. Such
+        date formats must be matched with `time.strptime(..)` instead.
 
     """
-    recursive_flag = " -r" if recursive else ""
+    pattern = []
+    fields = set()
+    # re.split(..) alternates between literal text and directives.
+    for i, part in enumerate(re.split(r"(%.?)", date_format)):
+        if i % 2 == 0:
+            pattern.append(
+                r"\s+".join(re.escape(literal) for literal in re.split(r"\s+", part)),
+            )
+        elif part == "%%":
+            pattern.append("%")
+        elif part[1:] in DATE_FORMAT_DIRECTIVES and part[1:] not in fields:
+            field = part[1:]
+            fields.add(field)
+            pattern.append(f"(?P<{field}>{DATE_FORMAT_DIRECTIVES[field]})")
+        else:
+            return None
+    return re.compile("".join(pattern), re.IGNORECASE)
+
+
+def snapshot_date(
+    vdev: str,
+    date_format: str,
+    snapshot: str,
+) -> tuple[int, ...] | None:
+    """Extract the date from a snapshot name.
+
+    Args:
+        vdev:        name of the vdev the snapshot is expected to belong to.
+        date_format: strftime(3) compatible date format used to name
+                     snapshots.
+        snapshot:    snapshot name.
+
+    Returns:
+        The date as a tuple of integers, in `time.struct_time` field order
+        (year, month, day, hour, minute, second), or None if the snapshot
+        doesn't belong to `vdev` or its name doesn't match the date format.
 
-    return zfs(f"list -H -t snapshot {recursive_flag} -o name {vdev}").splitlines()
+    """
+    prefix = snapshot_name(vdev, "")
+    if not snapshot.startswith(prefix):
+        return None
+
+    pattern = date_pattern(date_format)
+    if pattern is None:
+        try:
+            snapshot_time = time.strptime(snapshot[len(prefix) :], date_format)
+        except (ValueError, re.error):
+            # Date format does not match, or can't be parsed at all (e.g., a
+            # repeated directive).
+            return None
+        return tuple(snapshot_time[: len(DATE_FIELD_DEFAULTS)])
+
+    match = pattern.fullmatch(snapshot, len(prefix))
+    if match is None:
+        return None
+    fields = match.groupdict()
+    return tuple(
+        int(fields[field]) if field in fields else default
+        for field, default in DATE_FIELD_DEFAULTS.items()
+    )
 
 
 def is_destroyable_snapshot(
     vdev: str,
-    cutoff: time.struct_time,
+    cutoff: tuple[int, ...],
     date_format: str,
     snapshot: str,
-) -> bool:
+) -> bool | None:
     """Determine if a snapshot should be destroyed.
 
     Take a snapshot string, unmarshall the date, and determine if it's
@@ -117,22 +590,23 @@ def is_destroyable_snapshot(
         vdev:        name of the vdev to execute the snapshotting policy
                      (creation/deletion) on.
         cutoff:      any snapshots created before this time are nuked. This
-                     is a tuple, resembling a `time.struct_time` object.
+                     is a tuple of integers in `time.struct_time` field order;
+                     only the first six fields (year through second) are
+                     considered.
         date_format: a strftime(3) compatible date format to look for/destroy
                      snapshots with.
         snapshot:    snapshot name.
 
     Returns:
-        True if the snapshot is out of date; False otherwise.
+        True if the snapshot is out of date; False if it isn't; None if the
+        snapshot doesn't match `vdev` and `date_format`.
 
     """
-    snapshot_formatted = snapshot_name(vdev, date_format)
-    try:
-        snapshot_time = time.strptime(snapshot, snapshot_formatted)
-    except ValueError:
+    snapshot_time = snapshot_date(vdev, date_format, snapshot)
+    if snapshot_time is None:
         # Date format does not match
-        return False
-    return snapshot_time < time.struct_time(cutoff)
+        return None
+    return snapshot_time < tuple(cutoff[: len(DATE_FIELD_DEFAULTS)])
 
 
 def execute_snapshot_policy(
@@ -160,16 +634,45 @@ def execute_snapshot_policy(
         recursive:   execute zfs snapshot create recursively.
 
     """
-    snapshots = list_snapshots(vdev, recursive=recursive)
-
-    expired_snapshots = [
-        snapshot
-        for snapshot in snapshots
-        if is_destroyable_snapshot(vdev, cutoff, date_format, snapshot)
-    ]
-    for snapshot in sorted(expired_snapshots, reverse=True):
-        # Destroy snapshots as needed, reverse order so the snapshots will
-        # be destroyed in order.
-        destroy_snapshot(snapshot)
+    now_tuple = tuple(now[: len(DATE_FIELD_DEFAULTS)])
+    # Only the names of expired snapshots are kept while listing; they're
+    # destroyed once listing is complete, so they can be destroyed newest
+    # first.
+    expired_snapshots = []
+    # Only snapshots of `vdev` itself can match `date_format`; when recursing,
+    # child vdevs are handled by their own `execute_snapshot_policy(..)` calls,
+    # so don't walk their snapshots here.
+    snapshots = list_snapshots(
+        vdev,
+        recursive=recursive,
+        depth=1 if recursive else None,
+    )
+    with contextlib.closing(snapshots):
+        for snapshot in snapshots:
+            destroyable = is_destroyable_snapshot(
+                vdev, cutoff, date_format, snapshot,
+            )
+            if destroyable is None:
+                # Not managed by this policy, e.g., a manually created snapshot
+                # or a snapshot of a child vdev.
+                continue
+            if not destroyable:
+                snapshot_time = snapshot_date(vdev, date_format, snapshot)
+                if snapshot_time is not None and snapshot_time > now_tuple:
+                    # Dated in the future, e.g., taken while the clock was
+                    # wrong, so it's out of creation order; skip it.
+                    continue
+                # Snapshots are listed in creation order, so none of the
+                # remaining snapshots can have expired.
+                break
+            expired_snapshots.append(snapshot)
+
+    if expired_snapshots:
+        # Destroy snapshots as needed, reverse order so the snapshots will be
+        # destroyed in order. The matching snapshots are listed oldest first,
+        # and since their names are a fixed prefix followed by a most- to
+        # least-significant date (e.g., "auto-2018.09.01d"), that's also name
+        # order, so reversing the list is equivalent to sorting it in reverse.
+        destroy_snapshots(expired_snapshots[::-1])
 
     create_snapshot(vdev, time.strftime(date_format, now))
@@ -1,8 +1,10 @@
 """zfs_snapshot: CLI test."""
 # SPDX-License-Identifier: BSD-2-Clause
 
-# ruff: noqa: DTZ011, FBT003, INP001, S101, UP031
+# ruff: noqa: DTZ001, DTZ011, FBT003, INP001, S101, UP031
 
+import datetime
+import subprocess
 from typing import Self
 from unittest import mock
 
@@ -10,12 +12,13 @@ import pytest
 from dateutil.relativedelta import relativedelta
 
 from zfs_snapshot.__main__ import (
+    DATE_FORMATS,
     DEFAULT_SNAPSHOT_PERIOD,
     DEFAULT_SNAPSHOT_PREFIX,
-    NOW,
     SNAPSHOT_CATEGORIES,
     compute_cutoff,
     compute_vdevs,
+    main,
     parse_args,
     period_type,
 )
@@ -29,6 +32,16 @@ def patch_zfs_snapshot(rel_path: str) -> mock._patch:
 class TestArguments:
     vdevs = ["bogus-vdev", "bogus-vdev/nested", "another/bogus/vdev"]
 
+    def test_jobs(self: Self) -> None:
+        opts = parse_args(argv=[])
+        assert opts.jobs is None
+        opts = parse_args(argv=["--jobs", "4"])
+        assert opts.jobs == 4
+        with pytest.raises(SystemExit):
+            parse_args(argv=["--jobs", "0"])
+        with pytest.raises(SystemExit):
+            parse_args(argv=["--jobs", "apple"])
+
     def test_lifetime(self: Self) -> None:
         parse_args(argv=["--lifetime", "1"])
         parse_args(argv=["--lifetime", "42"])
@@ -75,10 +88,21 @@ class TestArguments:
         test_inputs_outputs_negative = [
             ["--vdev", "doesnotexist"],
             ["--vdev", vdevs[0] + " "],
+            # Values which look like zfs(8) options.
+            ["--vdev=-r"],
         ]
 
-        with patch_zfs_snapshot("list_vdevs") as list_vdevs:
-            list_vdevs.return_value = vdevs
+        def zfs_list(argv: list[str], quiet: bool = False) -> str:  # noqa: ARG001, FBT001, FBT002
+            vdev = argv[-1]
+            if vdev not in vdevs:
+                raise subprocess.CalledProcessError(1, argv)
+            return vdev + "\n"
+
+        with (
+            patch_zfs_snapshot("list_vdevs") as list_vdevs,
+            patch_zfs_snapshot("zfs") as zfs,
+        ):
+            zfs.side_effect = zfs_list
             for args, test_output in test_inputs_outputs_positive:
                 opts = parse_args(argv=args)
                 assert opts.vdevs == test_output
@@ -87,19 +111,37 @@ class TestArguments:
                 with pytest.raises(SystemExit):
                     parse_args(argv=args)
 
+            # Validation should only look up the vdevs specified.
+            list_vdevs.assert_not_called()
+            zfs.reset_mock()
+            parse_args(argv=["--vdev", vdevs[-1]])
+            zfs.assert_called_once_with(
+                [
+                    "list", "-H", "-t", "filesystem,volume", "-o", "name", "--",
+                    vdevs[-1],
+                ],
+                quiet=True,
+            )
+
 
 class TestMain:
     def test_compute_cutoff(self: Self) -> None:
         default_snapshot_type_index = period_type(DEFAULT_SNAPSHOT_PERIOD)
         default_snapshot_category = SNAPSHOT_CATEGORIES[default_snapshot_type_index]
-        assert compute_cutoff(default_snapshot_category, 42) == NOW - relativedelta(
+        now = datetime.datetime(2024, 6, 15, 12)
+        assert compute_cutoff(
+            default_snapshot_category, 42, now,
+        ) == now - relativedelta(
             **{default_snapshot_category.name: 42},
         )
         assert (
-            compute_cutoff(default_snapshot_category, None)
-            == NOW - default_snapshot_category.lifetime
+            compute_cutoff(default_snapshot_category, None, now)
+            == now - default_snapshot_category.lifetime
         )
 
+    def test_date_formats(self: Self) -> None:
+        assert DATE_FORMATS == ["%Y", "%Y.%m", "%Y.%m.%d", "%Y.%m.%d.%H"]
+
     def test_compute_vdevs(self: Self) -> None:
         all_vdevs = ["bogus-vdev", "bogus-vdev/nested", "another/bogus/vdev"]
 
@@ -115,27 +157,40 @@ class TestMain:
                 "bogus-vdev",
                 "bogus-vdev/nested",
             ]
-            zfs.assert_has_calls([mock.call("list -H -o name -r %s" % ("bogus-vdev"))])
+            zfs.assert_has_calls(
+                [mock.call(["list", "-H", "-o", "name", "-r", "bogus-vdev"])],
+            )
             zfs.reset_mock()
 
             # Recursive with --vdev, redux
-            zfs.side_effect = [
-                "bogus-vdev\nbogus-vdev/nested\n",
-                "another/bogus/vdev\n",
-            ]
+            zfs.side_effect = ["bogus-vdev\nbogus-vdev/nested\nanother/bogus/vdev\n"]
             assert compute_vdevs(["bogus-vdev", "another/bogus/vdev"], True) == [
                 "bogus-vdev",
                 "bogus-vdev/nested",
                 "another/bogus/vdev",
             ]
-            zfs.assert_has_calls(
-                [
-                    mock.call("list -H -o name -r %s" % ("bogus-vdev")),
-                    mock.call("list -H -o name -r %s" % ("another/bogus/vdev")),
-                ],
+            # All vdevs should be listed with a single zfs(8) call.
+            zfs.assert_called_once_with(
+                ["list", "-H", "-o", "name", "-r", "bogus-vdev", "another/bogus/vdev"],
             )
             zfs.reset_mock()
 
+            # Recursive with overlapping --vdev arguments: nested and duplicate
+            # vdevs are covered by their parent's recursive listing.
+            zfs.side_effect = ["bogus-vdev\nbogus-vdev/nested\n"]
+            assert compute_vdevs(
+                ["bogus-vdev/nested", "bogus-vdev", "bogus-vdev"], True,
+            ) == ["bogus-vdev", "bogus-vdev/nested"]
+            zfs.assert_called_once_with(
+                ["list", "-H", "-o", "name", "-r", "bogus-vdev"],
+            )
+            zfs.reset_mock()
+
+            # Non-recursive with duplicate --vdev arguments.
+            assert compute_vdevs(["bogus-vdev", "bogus-vdev"], False) == [
+                "bogus-vdev",
+            ]
+
             # Non-recursive with --vdev
             assert compute_vdevs(["bogus-vdev", "another/bogus/vdev"], False) == [
                 "bogus-vdev",
@@ -147,3 +202,46 @@ class TestMain:
 
             # All vdevs
             assert compute_vdevs([], False) == all_vdevs
+
+    def test_main(self: Self) -> None:
+        all_vdevs = ["bogus-vdev", "bogus-vdev/nested", "another/bogus/vdev"]
+
+        for argv in [[], ["--jobs", "1"], ["--jobs", "8"]]:
+            with (
+                patch_zfs_snapshot("execute_snapshot_policy") as execute_policy,
+                patch_zfs_snapshot("list_vdevs") as list_vdevs,
+            ):
+                list_vdevs.return_value = all_vdevs
+                assert main(argv) == 0
+                assert sorted(
+                    call.args[0] for call in execute_policy.call_args_list
+                ) == sorted(all_vdevs)
+
+        with (
+            patch_zfs_snapshot("execute_snapshot_policy") as execute_policy,
+            patch_zfs_snapshot("list_vdevs") as list_vdevs,
+        ):
+            list_vdevs.return_value = all_vdevs
+            execute_policy.side_effect = OSError("zfs failed")
+            with pytest.raises(OSError, match="zfs failed"):
+                main([])
+
+    def test_main_snapshot_prefix(self: Self) -> None:
+        # Prefixes end up in the snapshot date format, so they may contain
+        # strftime(3) directives (or a stray "%"); these shouldn't prevent
+        # snapshots from being taken.
+        for prefix in ["snap-%a", "100%"]:
+            with (
+                patch_zfs_snapshot("create_snapshot") as create_snapshot,
+                patch_zfs_snapshot("destroy_snapshots") as destroy_snapshots,
+                patch_zfs_snapshot("list_snapshots") as list_snapshots,
+                patch_zfs_snapshot("list_vdevs") as list_vdevs,
+            ):
+                list_vdevs.return_value = ["bogus-vdev"]
+                # list_snapshots(..) returns a generator.
+                list_snapshots.return_value = (
+                    snapshot for snapshot in ["bogus-vdev@before_reboot"]
+                )
+                assert main(["--snapshot-prefix", prefix]) == 0
+                create_snapshot.assert_called_once()
+                destroy_snapshots.assert_not_called()
@@ -3,8 +3,16 @@
 
 # ruff: noqa: DTZ011, FBT003, INP001, S101, UP031
 
+import ctypes
 import datetime
+import errno
+import os
+import signal
+import subprocess
+import sys
 import time
+from collections.abc import Iterator
+from types import SimpleNamespace
 from unittest import mock
 
 import pytest
@@ -12,11 +20,164 @@ import pytest
 from zfs_snapshot import zfs_snapshot
 
 
+# The `no_libzfs_core` fixture replaces this for most tests.
+LIBZFS_CORE = zfs_snapshot.libzfs_core.__wrapped__
+
+
 def patch_zfs_snapshot(rel_path: str) -> mock._patch:
     return mock.patch(f"{zfs_snapshot.__name__}.{rel_path}")
 
 
+@pytest.fixture(autouse=True)
+def no_libzfs_core() -> Iterator[None]:
+    """Exercise the zfs(8) code paths, regardless of what the host supports."""
+    with patch_zfs_snapshot("libzfs_core") as libzfs_core:
+        libzfs_core.return_value = None
+        yield
+
+
+class FakeLibZfsCore:
+    """Stand-ins for libzfs_core(3) and libnvpair(3).
+
+    The library functions are ctypes callbacks, so `LibZfsCore` calls them
+    through the same `argtypes`/`restype` conversions as the real libraries.
+    nvlists are integer handles; nvpairs encode their nvlist and position.
+    """
+
+    def __init__(self, errors: dict[str, int] | None = None, error: int = 0) -> None:
+        self.errors = errors or {}
+        self.error = error
+        self.calls: list[list[str]] = []
+        self.nvlists: dict[int, list[str]] = {}
+        self.freed: list[int] = []
+        self._names: list[ctypes.Array[ctypes.c_char]] = []
+
+        errlistp = ctypes.POINTER(ctypes.c_void_p)
+        self.libnvpair = SimpleNamespace(
+            nvlist_alloc=ctypes.CFUNCTYPE(
+                ctypes.c_int, errlistp, ctypes.c_uint, ctypes.c_int,
+            )(self.nvlist_alloc),
+            nvlist_add_boolean=ctypes.CFUNCTYPE(
+                ctypes.c_int, ctypes.c_void_p, ctypes.c_char_p,
+            )(self.nvlist_add_boolean),
+            nvlist_free=ctypes.CFUNCTYPE(None, ctypes.c_void_p)(self.nvlist_free),
+            nvlist_next_nvpair=ctypes.CFUNCTYPE(
+                ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
+            )(self.nvlist_next_nvpair),
+            # Returned as an address, since callbacks can't return c_char_p.
+            nvpair_name=ctypes.CFUNCTYPE(
+                ctypes.c_void_p, ctypes.c_void_p,
+            )(self.nvpair_name),
+            nvpair_value_int32=ctypes.CFUNCTYPE(
+                ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(ctypes.c_int32),
+            )(self.nvpair_value_int32),
+        )
+        self.libzfs_core = SimpleNamespace(
+            libzfs_core_init=ctypes.CFUNCTYPE(ctypes.c_int)(lambda: 0),
+            lzc_snapshot=ctypes.CFUNCTYPE(
+                ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p, errlistp,
+            )(self.lzc_call),
+            lzc_destroy_snaps=ctypes.CFUNCTYPE(
+                ctypes.c_int, ctypes.c_void_p, ctypes.c_int, errlistp,
+            )(self.lzc_call),
+        )
+
+    def cdll(self, path: str) -> SimpleNamespace:
+        return {"libzfs_core": self.libzfs_core, "libnvpair": self.libnvpair}[path]
+
+    def new_nvlist(self, names: list[str]) -> int:
+        handle = len(self.nvlists) + 1
+        self.nvlists[handle] = names
+        return handle
+
+    def nvlist_alloc(self, nvlp: ctypes._Pointer, _flag: int, _kmflag: int) -> int:
+        nvlp[0] = self.new_nvlist([])
+        return 0
+
+    def nvlist_add_boolean(self, nvl: int, name: bytes) -> int:
+        self.nvlists[nvl].append(name.decode())
+        return 0
+
+    def nvlist_free(self, nvl: int) -> None:
+        self.freed.append(nvl)
+
+    def nvlist_next_nvpair(self, nvl: int, nvp: int | None) -> int | None:
+        index = (nvp or 0) & 0xFFFF
+        if index < len(self.nvlists[nvl]):
+            return (nvl << 16) | (index + 1)
+        return None
+
+    def nvpair_name(self, nvp: int) -> int:
+        name = self.nvlists[nvp >> 16][(nvp & 0xFFFF) - 1]
+        self._names.append(ctypes.create_string_buffer(name.encode()))
+        return ctypes.addressof(self._names[-1])
+
+    def nvpair_value_int32(self, nvp: int, valuep: ctypes._Pointer) -> int:
+        valuep[0] = self.errors[self.nvlists[nvp >> 16][(nvp & 0xFFFF) - 1]]
+        return 0
+
+    def lzc_call(self, nvl: int, _arg: int | None, errlistp: ctypes._Pointer) -> int:
+        names = self.nvlists[nvl]
+        self.calls.append(list(names))
+        failed = [name for name in names if name in self.errors]
+        if failed:
+            errlistp[0] = self.new_nvlist(failed)
+            return self.errors[failed[0]]
+        return self.error
+
+
 class TestZfsSnapshot:
+    @staticmethod
+    def test_zfs() -> None:
+        """zfs(..)."""
+        with mock.patch.object(zfs_snapshot, "ZFS", sys.executable):
+            assert zfs_snapshot.zfs(["-c", 'print("a b\\nc")']) == "a b\nc\n"
+            with pytest.raises(subprocess.CalledProcessError) as excinfo:
+                zfs_snapshot.zfs(["-c", "print(1); raise SystemExit(1)"])
+            assert excinfo.value.output == "1\n"
+
+            # zfs(8) should be started with posix_spawn(3).
+            with mock.patch("os.posix_spawn", wraps=os.posix_spawn) as posix_spawn:
+                zfs_snapshot.zfs(["-c", "pass"])
+                posix_spawn.assert_called_once()
+                assert posix_spawn.call_args.args[1] == [sys.executable, "-c", "pass"]
+                # SIGPIPE should have its default disposition in zfs(8).
+                setsigdef = posix_spawn.call_args.kwargs["setsigdef"]
+                assert signal.SIGPIPE in setsigdef
+
+        with (
+            mock.patch.object(zfs_snapshot, "ZFS", "/nonexistent/zfs"),
+            pytest.raises(FileNotFoundError),
+        ):
+            zfs_snapshot.zfs(["list"])
+
+    @staticmethod
+    def test_zfs_quiet(capfd: pytest.CaptureFixture[str]) -> None:
+        """zfs(.., quiet=True)."""
+        argv = ["-c", 'import sys; sys.stderr.write("error\\n")']
+        with mock.patch.object(zfs_snapshot, "ZFS", sys.executable):
+            zfs_snapshot.zfs(argv)
+            assert capfd.readouterr().err == "error\n"
+            zfs_snapshot.zfs(argv, quiet=True)
+            assert capfd.readouterr().err == ""
+
+    @staticmethod
+    def test_zfs_iter() -> None:
+        """zfs_iter(..)."""
+        with mock.patch.object(zfs_snapshot, "ZFS", sys.executable):
+            output = zfs_snapshot.zfs_iter(["-c", 'print("a b\\nc")'])
+            assert list(output) == ["a b", "c"]
+
+            output = zfs_snapshot.zfs_iter(["-c", "print(1); raise SystemExit(1)"])
+            assert next(output) == "1"
+            with pytest.raises(subprocess.CalledProcessError):
+                next(output)
+
+            # Closing the iterator early should not raise an exception.
+            output = zfs_snapshot.zfs_iter(["-c", 'print("1\\n" * 100000)'])
+            assert next(output) == "1"
+            output.close()
+
     @staticmethod
     def test_create_snapshot() -> None:
         """create_snapshot(..)."""
@@ -25,7 +186,7 @@ class TestZfsSnapshot:
         with patch_zfs_snapshot("zfs") as zfs:
             zfs_snapshot.create_snapshot(vdev, date_format)
             snapshot = zfs_snapshot.snapshot_name(vdev, date_format)
-            zfs.assert_called_with("snapshot %s" % (snapshot))
+            zfs.assert_called_with(["snapshot", snapshot])
 
     @staticmethod
     def test_destroy_snapshot() -> None:
@@ -33,7 +194,155 @@ class TestZfsSnapshot:
         snapshot = "a-bogus-snapshot"
         with patch_zfs_snapshot("zfs") as zfs:
             zfs_snapshot.destroy_snapshot(snapshot)
-            zfs.assert_called_with("destroy %s" % (snapshot))
+            zfs.assert_called_with(["destroy", snapshot])
+
+    @staticmethod
+    def test_create_snapshot_libzfs_core() -> None:
+        """create_snapshot(..) with libzfs_core(3)."""
+        date_format = "test-1900.01.01d"
+        vdev = "a/bogus/vdev"
+        with (
+            patch_zfs_snapshot("libzfs_core") as libzfs_core,
+            patch_zfs_snapshot("zfs") as zfs,
+        ):
+            zfs_snapshot.create_snapshot(vdev, date_format)
+            snapshot = zfs_snapshot.snapshot_name(vdev, date_format)
+            libzfs_core.return_value.snapshot.assert_called_once_with([snapshot])
+            zfs.assert_not_called()
+
+    @staticmethod
+    def test_destroy_snapshot_libzfs_core() -> None:
+        """destroy_snapshot(..) with libzfs_core(3)."""
+        with (
+            patch_zfs_snapshot("libzfs_core") as libzfs_core,
+            patch_zfs_snapshot("zfs") as zfs,
+        ):
+            zfs_snapshot.destroy_snapshot("vdev@date1")
+            libzfs_core.return_value.destroy_snaps.assert_called_once_with(
+                ["vdev@date1"],
+            )
+            libzfs_core.reset_mock()
+
+            zfs_snapshot.destroy_snapshot("vdev@date1,date2")
+            libzfs_core.return_value.destroy_snaps.assert_called_once_with(
+                ["vdev@date1", "vdev@date2"],
+            )
+            zfs.assert_not_called()
+
+    @staticmethod
+    def test_libzfs_core() -> None:
+        """libzfs_core(..)."""
+        sonames = zfs_snapshot.LIBZFS_CORE_SONAMES
+
+        # Well-known library names are tried first.
+        with (
+            patch_zfs_snapshot("LibZfsCore") as lib_zfs_core,
+            mock.patch("ctypes.util.find_library") as find_library,
+        ):
+            lib_zfs_core.side_effect = [OSError(), mock.sentinel.lzc]
+            assert LIBZFS_CORE() is mock.sentinel.lzc
+            assert lib_zfs_core.call_args_list == [
+                mock.call(*sonames[0]),
+                mock.call(*sonames[1]),
+            ]
+            find_library.assert_not_called()
+
+        # ctypes.util.find_library(..) is the last resort.
+        with (
+            patch_zfs_snapshot("LibZfsCore") as lib_zfs_core,
+            mock.patch("ctypes.util.find_library") as find_library,
+        ):
+            lib_zfs_core.side_effect = [OSError()] * len(sonames) + [
+                mock.sentinel.lzc,
+            ]
+            find_library.side_effect = lambda name: "/lib/lib%s.so" % (name)
+            assert LIBZFS_CORE() is mock.sentinel.lzc
+            lib_zfs_core.assert_called_with("/lib/libzfs_core.so", "/lib/libnvpair.so")
+
+        # No usable libraries means falling back to zfs(8).
+        with (
+            patch_zfs_snapshot("LibZfsCore") as lib_zfs_core,
+            mock.patch("ctypes.util.find_library") as find_library,
+        ):
+            lib_zfs_core.side_effect = OSError()
+            find_library.return_value = None
+            assert LIBZFS_CORE() is None
+
+    @staticmethod
+    def test_lib_zfs_core() -> None:
+        """LibZfsCore(..)."""
+        snapshots = ["pool/a@x", "pool/a@y"]
+
+        def lib_zfs_core(fake: FakeLibZfsCore) -> zfs_snapshot.LibZfsCore:
+            with mock.patch("ctypes.CDLL", side_effect=fake.cdll):
+                return zfs_snapshot.LibZfsCore("libzfs_core", "libnvpair")
+
+        fake = FakeLibZfsCore()
+        lzc = lib_zfs_core(fake)
+        lzc.snapshot(snapshots)
+        lzc.destroy_snaps(snapshots)
+        assert fake.calls == [snapshots, snapshots]
+        assert sorted(fake.freed) == sorted(fake.nvlists)
+
+        # Errors are reported against the snapshots that failed, and the
+        # error list is freed.
+        fake = FakeLibZfsCore(errors={"pool/a@y": errno.EBUSY})
+        lzc = lib_zfs_core(fake)
+        with pytest.raises(OSError) as excinfo:  # noqa: PT011
+            lzc.destroy_snaps(snapshots)
+        assert excinfo.value.errno == errno.EBUSY
+        assert excinfo.value.filename == "pool/a@y"
+        assert sorted(fake.freed) == sorted(fake.nvlists)
+
+        fake = FakeLibZfsCore(
+            errors={"pool/a@x": errno.EBUSY, "pool/a@y": errno.EEXIST},
+        )
+        lzc = lib_zfs_core(fake)
+        with pytest.raises(OSError) as excinfo:  # noqa: PT011
+            lzc.destroy_snaps(snapshots)
+        assert excinfo.value.errno == errno.EBUSY
+        assert "pool/a@x: %s" % (os.strerror(errno.EBUSY)) in str(excinfo.value)
+        assert "pool/a@y: %s" % (os.strerror(errno.EEXIST)) in str(excinfo.value)
+        assert sorted(fake.freed) == sorted(fake.nvlists)
+
+        # Without an error list, the error applies to the whole request.
+        fake = FakeLibZfsCore(error=errno.ENOENT)
+        lzc = lib_zfs_core(fake)
+        with pytest.raises(OSError) as excinfo:  # noqa: PT011
+            lzc.snapshot(snapshots)
+        assert excinfo.value.errno == errno.ENOENT
+        assert excinfo.value.filename == "pool/a@x,pool/a@y"
+
+    @staticmethod
+    def test_destroy_snapshots() -> None:
+        """destroy_snapshots(..)."""
+        with patch_zfs_snapshot("zfs") as zfs:
+            zfs_snapshot.destroy_snapshots([])
+            zfs.assert_not_called()
+
+        snapshots = [
+            "vdev/nested@date2",
+            "vdev/nested@date1",
+            "vdev@date2",
+            "vdev@date1",
+        ]
+        with patch_zfs_snapshot("zfs") as zfs:
+            zfs_snapshot.destroy_snapshots(snapshots)
+            assert zfs.call_args_list == [
+                mock.call(["destroy", "vdev/nested@date2,date1"]),
+                mock.call(["destroy", "vdev@date2,date1"]),
+            ]
+
+        # Verify that large sets of snapshots are destroyed in batches.
+        batch_size = zfs_snapshot.DESTROY_BATCH_SIZE
+        names = ["date%d" % (i) for i in range(batch_size + 1)]
+        snapshots = [zfs_snapshot.snapshot_name("vdev", name) for name in names]
+        with patch_zfs_snapshot("zfs") as zfs:
+            zfs_snapshot.destroy_snapshots(snapshots)
+            assert zfs.call_args_list == [
+                mock.call(["destroy", "vdev@%s" % (",".join(names[:batch_size]))]),
+                mock.call(["destroy", "vdev@%s" % (names[batch_size])]),
+            ]
 
     def test_list_snapshots(self) -> None:
         """list_snapshots(..)."""
@@ -51,20 +360,32 @@ class TestZfsSnapshot:
         ]
         for test_inputs, test_outputs in test_input_outputs:
             recursive = True if len(test_inputs) == 1 else test_inputs[-1]
-            with patch_zfs_snapshot("zfs") as zfs:
-                zfs.return_value = "\n".join(
-                    [
-                        snapshot
-                        for snapshot in test_snapshots
-                        if snapshot.startswith(
-                            test_vdev + zfs_snapshot.SNAPSHOT_SEPARATOR,
-                        )
-                        or (recursive and snapshot.startswith(test_vdev + "/"))
-                    ],
-                )
+            with patch_zfs_snapshot("zfs_iter") as zfs_iter:
+                zfs_iter.return_value = [
+                    snapshot
+                    for snapshot in test_snapshots
+                    if snapshot.startswith(
+                        test_vdev + zfs_snapshot.SNAPSHOT_SEPARATOR,
+                    )
+                    or (recursive and snapshot.startswith(test_vdev + "/"))
+                ]
                 assert (
-                    zfs_snapshot.list_snapshots(*test_inputs) == test_outputs
+                    list(zfs_snapshot.list_snapshots(*test_inputs)) == test_outputs
                 ), "zfs_snapshot.list_snapshots(%r)" % (repr(test_inputs))
+                # Snapshots should be sorted by creation time.
+                argv = zfs_iter.call_args.args[0]
+                assert argv[argv.index("-s") + 1] == "creation"
+
+        # Limiting the depth takes precedence over recursion.
+        for recursive in [False, True]:
+            with patch_zfs_snapshot("zfs_iter") as zfs_iter:
+                zfs_iter.return_value = test_snapshots[0:1]
+                assert list(
+                    zfs_snapshot.list_snapshots(test_vdev, recursive, depth=1),
+                ) == test_snapshots[0:1]
+                argv = zfs_iter.call_args.args[0]
+                assert argv[argv.index("-d") + 1] == "1"
+                assert "-r" not in argv
 
     def test_list_vdevs(self) -> None:
         """list_vdevs(..).
@@ -75,12 +396,12 @@ class TestZfsSnapshot:
         test_vdev_sets = [["vdev"], ["vdev1", "vdev2", "vdev3/sub-vdev"]]
 
         for test_vdev_list in test_vdev_sets:
-            with patch_zfs_snapshot("zfs") as zfs:
-                zfs.return_value = "\n".join(test_vdev_list)
+            with patch_zfs_snapshot("zfs_iter") as zfs_iter:
+                zfs_iter.return_value = iter(test_vdev_list)
                 assert zfs_snapshot.list_vdevs() == test_vdev_list
 
-        with patch_zfs_snapshot("zfs") as zfs:
-            zfs.return_value = ""
+        with patch_zfs_snapshot("zfs_iter") as zfs_iter:
+            zfs_iter.return_value = iter([])
             with pytest.raises(zfs_snapshot.VdevNotFoundError):
                 zfs_snapshot.list_vdevs()
 
@@ -91,95 +412,96 @@ class TestZfsSnapshot:
         This test method is a functional smoke test, more or less.
         """
         test_vdev = "vdev"
-        test_cutoff = datetime.date.today().timetuple()
+        today = datetime.date.today()
+        test_cutoff = today.timetuple()
         test_date_format = "%Y-%m-%d-%H.%M"
         now = time.localtime()
 
-        test_snapshots = [
-            zfs_snapshot.snapshot_name(test_vdev, "date1"),
-            zfs_snapshot.snapshot_name("%s/nested" % (test_vdev), "date1"),
-            zfs_snapshot.snapshot_name("i/will/not/match", "date3"),
-        ]
-        num_snapshots = len(test_snapshots)
-
-        with (
-            patch_zfs_snapshot("create_snapshot") as create_snapshot,
-            patch_zfs_snapshot("destroy_snapshot") as destroy_snapshot,
-            patch_zfs_snapshot("is_destroyable_snapshot") as is_destroyable_snapshot,
-            patch_zfs_snapshot("list_snapshots") as list_snapshots,
-        ):
-            list_snapshots.return_value = []
-            zfs_snapshot.execute_snapshot_policy(
-                test_vdev,
-                now,
-                test_cutoff,
-                test_date_format,
-            )
-            # No snapshots means none of these methods (minus create_snapshot)
-            # should have been called
-            is_destroyable_snapshot.assert_not_called()
-            destroy_snapshot.assert_not_called()
-            create_snapshot.assert_called_with(
-                test_vdev,
-                time.strftime(test_date_format, now),
+        def dated_snapshot(vdev: str, date: datetime.date) -> str:
+            return zfs_snapshot.snapshot_name(
+                vdev, date.strftime(test_date_format),
             )
 
-        # Verify that no snapshots are destroyed if they haven't expired.
-        with (
-            patch_zfs_snapshot("create_snapshot") as create_snapshot,
-            patch_zfs_snapshot("destroy_snapshot") as destroy_snapshot,
-            patch_zfs_snapshot("is_destroyable_snapshot") as is_destroyable_snapshot,
-            patch_zfs_snapshot("list_snapshots") as list_snapshots,
-        ):
-            list_snapshots.return_value = test_snapshots
-            is_destroyable_snapshot.side_effect = [False] * num_snapshots
-            zfs_snapshot.execute_snapshot_policy(
-                test_vdev,
-                now,
-                test_cutoff,
-                test_date_format,
-            )
-            destroy_snapshot.assert_not_called()
-            create_snapshot.assert_called_with(
-                test_vdev,
-                time.strftime(test_date_format, now),
-            )
+        two_days_ago = dated_snapshot(test_vdev, today - datetime.timedelta(days=2))
+        yesterday = dated_snapshot(test_vdev, today - datetime.timedelta(days=1))
+        tomorrow = dated_snapshot(test_vdev, today + datetime.timedelta(days=1))
+        current = zfs_snapshot.snapshot_name(
+            test_vdev, time.strftime(test_date_format, now),
+        )
+        # Snapshots which don't match the policy are left alone.
+        unmanaged_snapshots = [
+            dated_snapshot("%s/nested" % (test_vdev), today - datetime.timedelta(2)),
+            zfs_snapshot.snapshot_name(test_vdev, "before_reboot"),
+        ]
 
-        # Verify that a single snapshot is destroyed because it has expired.
-        with (
-            patch_zfs_snapshot("create_snapshot") as create_snapshot,
-            patch_zfs_snapshot("destroy_snapshot") as destroy_snapshot,
-            patch_zfs_snapshot("is_destroyable_snapshot") as is_destroyable_snapshot,
-            patch_zfs_snapshot("list_snapshots") as list_snapshots,
-        ):
-            list_snapshots.return_value = test_snapshots
-            is_destroyable_snapshot.side_effect = [True] + [False] * (num_snapshots - 1)
-            zfs_snapshot.execute_snapshot_policy(
-                test_vdev,
-                now,
-                test_cutoff,
-                test_date_format,
-            )
-            destroy_snapshot.assert_called_with(test_snapshots[0])
-            create_snapshot.assert_called_with(
-                test_vdev,
-                time.strftime(test_date_format, now),
-            )
+        test_inputs_outputs = [
+            # No snapshots means no snapshots should be destroyed.
+            ([], []),
+            # Verify that no snapshots are destroyed if they haven't expired.
+            ([*unmanaged_snapshots, tomorrow], []),
+            # Verify that a single snapshot is destroyed because it has expired.
+            ([yesterday, *unmanaged_snapshots, tomorrow], [yesterday]),
+            # Ensure that expired snapshots are destroyed in reverse order.
+            #
+            # This is needed, otherwise, zfs will fail stating that the parent
+            # dataset still has snapshot references that has not been
+            # destroyed in child datasets
+            (
+                [two_days_ago, unmanaged_snapshots[0], yesterday, tomorrow],
+                [yesterday, two_days_ago],
+            ),
+            # Snapshots are listed in creation order, so nothing after the
+            # first unexpired snapshot is considered.
+            ([current, two_days_ago], []),
+            # ... except for snapshots dated in the future (e.g., taken while
+            # the clock was wrong), which are out of order.
+            ([tomorrow, two_days_ago, current, yesterday], [two_days_ago]),
+        ]
 
-        # Ensure that expired snapshots are destroyed in reverse order.
-        #
-        # This is needed, otherwise, zfs will fail stating that the parent
-        # dataset still has snapshot references that has not been destroyed
-        # in child datasets
+        for snapshots, expired_snapshots in test_inputs_outputs:
+            with (
+                patch_zfs_snapshot("create_snapshot") as create_snapshot,
+                patch_zfs_snapshot("destroy_snapshots") as destroy_snapshots,
+                patch_zfs_snapshot("list_snapshots") as list_snapshots,
+            ):
+                # list_snapshots(..) returns a generator.
+                list_snapshots.return_value = (snapshot for snapshot in snapshots)
+                zfs_snapshot.execute_snapshot_policy(
+                    test_vdev,
+                    now,
+                    test_cutoff,
+                    test_date_format,
+                )
+                list_snapshots.assert_called_once_with(
+                    test_vdev, recursive=True, depth=1,
+                )
+                if expired_snapshots:
+                    destroy_snapshots.assert_called_once_with(expired_snapshots)
+                else:
+                    destroy_snapshots.assert_not_called()
+                create_snapshot.assert_called_with(
+                    test_vdev,
+                    time.strftime(test_date_format, now),
+                )
+
+        # Snapshots are destroyed newest first, even when there are more
+        # expired snapshots than fit in a single batch.
+        batch_size = zfs_snapshot.DESTROY_BATCH_SIZE
+        expired_snapshots = [
+            dated_snapshot(test_vdev, today - datetime.timedelta(days=i))
+            for i in range(batch_size + 50, 0, -1)
+        ]
+        names = [
+            snapshot.partition(zfs_snapshot.SNAPSHOT_SEPARATOR)[-1]
+            for snapshot in reversed(expired_snapshots)
+        ]
         with (
-            patch_zfs_snapshot("create_snapshot") as create_snapshot,
-            patch_zfs_snapshot("destroy_snapshot") as destroy_snapshot,
-            patch_zfs_snapshot("is_destroyable_snapshot") as is_destroyable_snapshot,
+            patch_zfs_snapshot("create_snapshot"),
             patch_zfs_snapshot("list_snapshots") as list_snapshots,
+            patch_zfs_snapshot("zfs") as zfs,
         ):
-            list_snapshots.return_value = test_snapshots
-            is_destroyable_snapshot.side_effect = [True] * 2 + [False] * (
-                num_snapshots - 2
+            list_snapshots.return_value = (
+                snapshot for snapshot in [*expired_snapshots, tomorrow]
             )
             zfs_snapshot.execute_snapshot_policy(
                 test_vdev,
@@ -187,20 +509,17 @@ class TestZfsSnapshot:
                 test_cutoff,
                 test_date_format,
             )
-            destroy_snapshot.assert_has_calls(
-                [
-                    mock.call(snapshot)
-                    for snapshot in sorted(test_snapshots[:2], reverse=True)
-                ],
-            )
-            create_snapshot.assert_called_with(
-                test_vdev,
-                time.strftime(test_date_format, now),
-            )
+            assert zfs.call_args_list == [
+                mock.call(
+                    ["destroy", "%s@%s" % (test_vdev, ",".join(names[:batch_size]))],
+                ),
+                mock.call(
+                    ["destroy", "%s@%s" % (test_vdev, ",".join(names[batch_size:]))],
+                ),
+            ]
 
     def test_is_destroyable_snapshot(self) -> None:
         """is_destroyable_snapshot(..)."""
-        # def is_destroyable_snapshot(vdev, cutoff, date_format, snapshot):
         date_format = "%Y-%m-%d-%H.%M"
         vdev = "vdev"
         nested_vdev = "vdev/nested"
@@ -218,13 +537,75 @@ class TestZfsSnapshot:
 
         assert zfs_snapshot.is_destroyable_snapshot(
             vdev, future_cutoff, date_format, snapshot,
-        )
-        assert not zfs_snapshot.is_destroyable_snapshot(
+        ) is True
+        assert zfs_snapshot.is_destroyable_snapshot(
             nested_vdev, past_cutoff, date_format, snapshot,
-        )
-        assert not zfs_snapshot.is_destroyable_snapshot(
+        ) is None
+        assert zfs_snapshot.is_destroyable_snapshot(
             vdev, past_cutoff, date_format, snapshot_not_dated,
-        )
-        assert not zfs_snapshot.is_destroyable_snapshot(
+        ) is None
+        assert zfs_snapshot.is_destroyable_snapshot(
             vdev, past_cutoff, date_format, snapshot,
+        ) is False
+
+    def test_snapshot_date(self) -> None:
+        """date_pattern(..) and snapshot_date(..)."""
+        vdev = "pool/vdev"
+        date_formats = [
+            "auto-%Y",
+            "auto-%Y.%mm",
+            "auto-%Y.%m.%dd",
+            "auto-%Y.%m.%d.%HH",
+            "%Y-%m-%d-%H.%M.%S",
+            "100%%-%Y%m%d",
+            # These aren't supported by date_pattern(..), so
+            # time.strptime(..) is used instead.
+            "snap-%a-%Y.%m.%dd",
+        ]
+        now = time.localtime()
+        for date_format in date_formats:
+            snapshot = zfs_snapshot.snapshot_name(
+                vdev, time.strftime(date_format, now),
+            )
+            expected = time.strptime(
+                snapshot, zfs_snapshot.snapshot_name(vdev, date_format),
+            )
+            assert (
+                zfs_snapshot.snapshot_date(vdev, date_format, snapshot)
+                == expected[:6]
+            )
+            for not_matching in [snapshot + "x", "x" + snapshot]:
+                assert (
+                    zfs_snapshot.snapshot_date(vdev, date_format, not_matching)
+                    is None
+                )
+            # Snapshots of other vdevs don't match.
+            for other_vdev in ["pool", "pool/vdev/nested", "pool/vdev2"]:
+                assert (
+                    zfs_snapshot.snapshot_date(other_vdev, date_format, snapshot)
+                    is None
+                )
+
+        # Patterns are compiled once per date format.
+        assert zfs_snapshot.date_pattern("auto-%Y") is zfs_snapshot.date_pattern(
+            "auto-%Y",
         )
+
+        date_format = "auto-%Y.%m.%dd"
+        for snapshot in ["pool/vdev@auto-2024.13.01d", "pool/vdevXauto-2024.01.01d"]:
+            assert zfs_snapshot.snapshot_date(vdev, date_format, snapshot) is None
+
+        # Like time.strptime(..), matching is case-insensitive and whitespace
+        # matches any run of whitespace.
+        for date_format, snapshot in [
+            ("AUTO-%Y.%m.%dd", "pool/vdev@auto-2024.01.01d"),
+            ("auto %Y.%m.%dd", "pool/vdev@auto  2024.01.01d"),
+        ]:
+            assert zfs_snapshot.snapshot_date(vdev, date_format, snapshot) == (
+                2024, 1, 1, 0, 0, 0,
+            )
+
+        for date_format in ["%Y.%Y", "%a", "trailing-%"]:
+            assert zfs_snapshot.date_pattern(date_format) is None
+            # Date formats time.strptime(..) can't parse don't match anything.
+            assert zfs_snapshot.snapshot_date(vdev, date_format, "pool/vdev@x") is None